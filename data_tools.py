@@ -11,76 +11,611 @@
     - read_parquet: read Parquet file, extract embedded metadata, and convert trajectory data back to dictionary format.
     - plot_trajectory_spacetime_diagram: plot trajectory spacetime diagram from Parquet file.
 '''
+import hashlib
 import json
-import pandas as pd
+from dataclasses import dataclass
 import pyarrow as pa
 import pyarrow.parquet as pq
+import pyarrow.compute as pc
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
 import os
+import multiprocessing
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
 
-def read_parquet(parquet_path):
+import meta_json
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    # numba is optional; fall back to the NumPy implementation
+    HAS_NUMBA = False
+
+# Columns actually touched by each consumer, used for Parquet column projection
+PLOT_COLUMNS = ['vehicle_id', 'frame_index', 'frenet_s', 'frenet_s_speed', 'lane_id', 'vehicle_length']
+ANALYSIS_COLUMNS = ['vehicle_id', 'frame_index', 'lane_id']
+# Above this many segments per lane, draw a mean-speed raster instead of a LineCollection
+RASTER_SEGMENT_THRESHOLD = 100_000
+RASTER_BINS = (2000, 800)  # (time, location) bins
+RASTER_SAMPLES_PER_SEGMENT = 4
+# Vehicle chunks scanned in parallel by the numba segment kernel (bounds its scratch memory)
+NUMBA_VEHICLE_CHUNKS = 256
+# Parquet metadata key of the movement statistics written by update_parquet_meta.py --precompute-analysis
+ANALYSIS_CACHE_KEY = b'analysis_cache'
+# Narrower element types the numeric list columns are cast to on read
+DOWNCAST_TYPES = {
+    'frame_index': pa.int32(),
+    'frenet_s': pa.float32(),
+    'frenet_s_speed': pa.float32(),
+    'lane_id': pa.int16(),
+}
+
+
+def _parse_dataset_meta(file_meta):
     '''
-    Read Parquet file, extract embedded metadata, and convert trajectory data back to dictionary format.
+    Decode the 'dataset_meta' JSON blob from Parquet schema metadata.
     
-    :param parquet_path: the path to the Parquet file
-    :return: restored_tracks (Dict), restored_meta (Dict)
+    :param file_meta: the schema metadata (Dict[bytes, bytes] or None)
+    :return: meta data (Dict), or None if 'dataset_meta' is not present
     '''
-    print("\n--- Reading back from Parquet ---")
+    if not file_meta or b'dataset_meta' not in file_meta:
+        return None
+    return meta_json.loads(file_meta[b'dataset_meta'])
+
+
+@lru_cache(maxsize=32)
+def _load_meta(parquet_path, mtime):
+    '''
+    Parse 'dataset_meta' from the Parquet footer only (no column data is read).
+    Cached per (path, modification time), so a rewritten file is parsed again.
+    
+    :param parquet_path: the path to a Parquet file
+    :param mtime: modification time of the file (cache key only)
+    :return: meta data (Dict), or None if 'dataset_meta' is not present
+    '''
+    return _parse_dataset_meta(pq.read_metadata(parquet_path).metadata)
+
+
+def read_dataset_meta(parquet_path):
+    '''
+    Read only the embedded metadata of a Parquet file, e.g. to decide which columns to read.
+    The result is cached (see _load_meta) and shared between callers: do not modify it.
     
-    # 1. Read Parquet file
-    table = pq.read_table(parquet_path)
+    :param parquet_path: the path to a Parquet file
+    :return: meta data (Dict), or None if 'dataset_meta' is not present
+    '''
+    return _load_meta(parquet_path, os.stat(parquet_path).st_mtime_ns)
+
+
+def _list_offsets_values(column):
+    '''
+    Expose an Arrow list column as flat NumPy buffers.
+    The elements of row i are values[offsets[i]:offsets[i+1]]; null rows are empty.
     
-    # 2. Extract and parse Metadata
-    file_meta = table.schema.metadata
+    :param column: pyarrow (Chunked)Array of list type
+    :return: offsets (np.ndarray, length N+1), values (np.ndarray)
+    '''
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if pa.types.is_null(column.type):
+        # Every row is null (e.g. a column that was None for all tracks)
+        return np.zeros(len(column) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    offsets = column.offsets.to_numpy()
+    values = column.values.to_numpy(zero_copy_only=False)
+    return offsets, values
+
+
+def _is_numeric_list(data_type):
+    '''
+    Whether data_type is a list of plain ints/floats (frame_index, frenet_s, lane_id, ...).
+    '''
+    return (pa.types.is_list(data_type) or pa.types.is_large_list(data_type)) and \
+        (pa.types.is_integer(data_type.value_type) or pa.types.is_floating(data_type.value_type))
+
+
+def downcast_columns(data):
+    '''
+    Cast the numeric list columns in DOWNCAST_TYPES to their narrower element type
+    (frame_index -> int32, frenet_s / frenet_s_speed -> float32, lane_id -> int16).
+    Columns that are missing, already narrow enough, or hold values outside the range
+    of the narrower type are left as they are (decided per batch when streaming).
+    Note that float32 keeps ~7 significant digits (e.g. 100000.123 becomes 100000.125).
     
-    if b'dataset_meta' in file_meta:
-        restored_meta_json = file_meta[b'dataset_meta'].decode('utf-8')
-        restored_meta = json.loads(restored_meta_json)
+    :param data: pyarrow Table or RecordBatch
+    :return: the same kind of object with the downcast columns
+    '''
+    schema = data.schema
+    columns = list(data.columns)
+    for name, value_type in DOWNCAST_TYPES.items():
+        index = schema.get_field_index(name)
+        if index == -1 or not _is_numeric_list(schema.field(index).type):
+            continue
+        list_type = schema.field(index).type
+        current = list_type.value_type
+        if (pa.types.is_integer(current) != pa.types.is_integer(value_type)
+                or current.bit_width <= value_type.bit_width):
+            continue
+        # Keep the stored type if any value does not fit the narrower one
+        value_range = pc.min_max(pc.list_flatten(columns[index])).as_py()
+        numpy_type = value_type.to_pandas_dtype()
+        limits = np.iinfo(numpy_type) if pa.types.is_integer(value_type) else np.finfo(numpy_type)
+        if value_range['min'] is not None and (value_range['min'] < float(limits.min)
+                                               or value_range['max'] > float(limits.max)):
+            continue
+        list_factory = pa.large_list if pa.types.is_large_list(list_type) else pa.list_
+        target_type = list_factory(list_type.value_field.with_type(value_type))
+        columns[index] = pc.cast(columns[index], target_type)
+        schema = schema.set(index, schema.field(index).with_type(target_type))
+    return type(data).from_arrays(columns, schema=schema)
+
+
+def _column_to_rows(column):
+    '''
+    Convert one Arrow column into a Python list with one entry per row.
+    Numeric list columns become zero-copy NumPy views of the flat Arrow values
+    buffer (read-only); nested/scalar columns go through to_pylist().
+    '''
+    if not _is_numeric_list(column.type):
+        return column.to_pylist()
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if len(column) == 0:
+        return []
+    offsets, values = _list_offsets_values(column)
+    rows = np.split(values[offsets[0]:offsets[-1]], offsets[1:-1] - offsets[0])
+    if column.null_count:
+        for i in np.flatnonzero(column.is_null().to_numpy(zero_copy_only=False)):
+            rows[i] = None
+    return rows
+
+
+def _columns_to_tracks(data):
+    '''
+    Convert an Arrow Table or RecordBatch into {vehicle_id: {column: value}}.
+    Each column is materialized once and the rows are zipped together.
+    '''
+    cols = {name: _column_to_rows(data.column(name)) for name in data.column_names}
+    # Assume vehicle_id exists and is unique
+    if 'vehicle_id' not in cols:
+        return {}
+    vehicle_ids = cols.pop('vehicle_id')
+    keys = list(cols.keys())
+    dict_ = dict
+    return {vid: dict_(zip(keys, row)) for vid, row in zip(vehicle_ids, zip(*cols.values()))}
+
+
+@dataclass
+class TrajectoryColumns:
+    '''
+    Columnar (struct-of-arrays) view of the trajectory data used for plotting.
+    Per-frame columns are flat 1D arrays concatenated across vehicles; the frames of
+    vehicle i are [offsets[i], offsets[i+1]).
+    '''
+    vehicle_ids: np.ndarray
+    offsets: np.ndarray
+    frame_index: np.ndarray
+    frenet_s: np.ndarray
+    frenet_s_speed: np.ndarray
+    lane_id: np.ndarray
+    vehicle_length: np.ndarray
+
+    FRAME_COLUMNS = ('frame_index', 'frenet_s', 'frenet_s_speed', 'lane_id')
+    DEFAULT_VEHICLE_LENGTH = 5.0
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    @classmethod
+    def from_table(cls, table):
+        '''
+        Build from a pyarrow Table with vehicle_id, the FRAME_COLUMNS list columns
+        and an optional vehicle_length column. Numeric buffers are shared with Arrow where possible.
+        '''
+        offsets = None
+        frame_columns = {}
+        for name in cls.FRAME_COLUMNS:
+            col_offsets, col_values = _list_offsets_values(table.column(name))
+            # Normalize to offsets starting at 0 over the referenced values only
+            col_values = col_values[col_offsets[0]:col_offsets[-1]]
+            col_offsets = col_offsets - col_offsets[0]
+            if offsets is None:
+                offsets = col_offsets
+            elif not np.array_equal(offsets, col_offsets):
+                raise ValueError(f"Column '{name}' does not have the same per-vehicle length as '{cls.FRAME_COLUMNS[0]}'")
+            frame_columns[name] = col_values
+        
+        if 'vehicle_length' in table.column_names:
+            vehicle_length = pc.fill_null(table.column('vehicle_length'), cls.DEFAULT_VEHICLE_LENGTH)
+            vehicle_length = vehicle_length.to_numpy().astype(np.float64)
+        else:
+            vehicle_length = np.full(table.num_rows, cls.DEFAULT_VEHICLE_LENGTH)
+        
+        return cls(
+            vehicle_ids=table.column('vehicle_id').to_numpy(),
+            offsets=offsets,
+            vehicle_length=vehicle_length,
+            **frame_columns
+        )
+
+    @classmethod
+    def from_tracks(cls, trajectory_data):
+        '''
+        Build from the {vehicle_id: track} dictionary format returned by read_parquet.
+        '''
+        # Single pass over the tracks, one dictionary lookup per column
+        chunks = {name: [] for name in cls.FRAME_COLUMNS}
+        vehicle_length = np.empty(len(trajectory_data), dtype=np.float64)
+        for i, track in enumerate(trajectory_data.values()):
+            for name, column_chunks in chunks.items():
+                values = track.get(name)
+                column_chunks.append(np.zeros(0) if values is None else np.asarray(values))
+            length = track.get('vehicle_length')
+            # Missing and null lengths both get the default, as in from_table
+            vehicle_length[i] = cls.DEFAULT_VEHICLE_LENGTH if length is None else length
         
+        offsets = np.zeros(len(trajectory_data) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in chunks[cls.FRAME_COLUMNS[0]]], out=offsets[1:])
+        frame_columns = {name: np.concatenate(column_chunks) if column_chunks else np.zeros(0)
+                         for name, column_chunks in chunks.items()}
+        return cls(
+            vehicle_ids=np.array(list(trajectory_data.keys())),
+            offsets=offsets,
+            vehicle_length=vehicle_length,
+            **frame_columns
+        )
+
+    def as_dict(self):
+        '''
+        Convert back to the {vehicle_id: track} dictionary format (tracks hold array views).
+        '''
+        split_points = self.offsets[1:-1]
+        columns = {name: np.split(getattr(self, name), split_points) for name in self.FRAME_COLUMNS}
+        tracks = {}
+        for i, vid in enumerate(self.vehicle_ids.tolist()):
+            track = {name: columns[name][i] for name in self.FRAME_COLUMNS}
+            track['vehicle_length'] = float(self.vehicle_length[i])
+            tracks[vid] = track
+        return tracks
+
+
+def _report_loaded(restored_meta, schema, num_rows, table=None):
+    '''
+    Print the embedded metadata and a summary of the loaded trajectory data.
+    
+    :param restored_meta: the parsed metadata (Dict), or None if not present
+    :param schema: the Arrow schema of the data that is read
+    :param num_rows: number of rows (vehicles) in the file
+    :param table: the loaded table, used to show a pixel_corners sample
+    :return: restored_meta (Dict)
+    '''
+    if restored_meta is not None:
         print("\n[Success] Meta embedded in Parquet found:")
         # Print all meta info
         print(restored_meta)
         print(f"  - Location: {restored_meta.get('location_name')}")
         print(f"  - Lane Map (Dict): {restored_meta.get('lane_sequence_to_movement_map')}")
     else:
+        restored_meta = {}
         print("\n[Warning] 'dataset_meta' key not found in Parquet header.")
     
-    # 3. Convert back to DataFrame to view data
-    df_read = table.to_pandas()
-    
+    # Inspect the Arrow data directly (no pandas DataFrame round-trip)
     print("\n[Success] Trajectory Data loaded:")
-    print(f"  - Shape: {df_read.shape}")
-    print(f"  - Columns: {list(df_read.columns)}")
+    print(f"  - Shape: {(num_rows, len(schema.names))}")
+    print(f"  - Columns: {schema.names}")
     
     # Verify complex structure (pixel_corners)
-    sample_corners = df_read.iloc[0]['pixel_corners']
-    print(f"  - Sample pixel_corners type: {type(sample_corners)}")
-    print(f"  - Sample pixel_corners shape (len): {len(sample_corners)} (should be 5)")
-
-      # 4. Convert back to Dict 
-    print("\n--- Converting DataFrame back to Dict ---")
-    restored_tracks = {}
-    # Convert DataFrame to record list
-    records = df_read.to_dict(orient='records')
-    
-    for record in records:
-        # Assume vehicle_id exists and is unique
-        if 'vehicle_id' in record:
-            vid = record['vehicle_id']
-            del record['vehicle_id']
-            restored_tracks[vid] = record
-            
+    if table is not None and table.num_rows > 0 and 'pixel_corners' in table.column_names:
+        sample_corners = table.column('pixel_corners')[0].as_py()
+        print(f"  - Sample pixel_corners type: {type(sample_corners)}")
+        print(f"  - Sample pixel_corners shape (len): {len(sample_corners)} (should be 5)")
+    return restored_meta
+
+
+def read_parquet_meta(parquet_path, columns=None, downcast=False):
+    '''
+    Read Parquet file into a pyarrow Table and extract embedded metadata,
+    without converting the trajectory data to dictionary format.
+    
+    :param parquet_path: the path to the Parquet file
+    :param columns: only read these columns (None reads all); 'vehicle_id' is always included
+    :param downcast: cast the numeric list columns to narrower types (see downcast_columns); off by default
+    :return: table (pyarrow.Table), restored_meta (Dict)
+    '''
+    print("\n--- Reading back from Parquet ---")
+    
+    if columns is not None and 'vehicle_id' not in columns:
+        columns = ['vehicle_id'] + list(columns)
+    
+    # Memory-mapped, coalesced (pre_buffer) reads; column chunks are decoded in parallel
+    table = pq.read_table(parquet_path, columns=columns, memory_map=True, use_threads=True, pre_buffer=True)
+    if downcast:
+        table = downcast_columns(table)
+    restored_meta = _report_loaded(_parse_dataset_meta(table.schema.metadata), table.schema, table.num_rows, table)
+    return table, restored_meta
+
+
+def _report_tracks(restored_tracks):
+    '''
+    Print a summary of the restored track dictionary.
+    '''
     print(f"[Success] Converted back to Dict. Total tracks: {len(restored_tracks)}")
     if restored_tracks:
-        sample_vid = list(restored_tracks.keys())[0]
+        sample_vid = next(iter(restored_tracks))
         print(f"  - Sample Vehicle ID: {sample_vid}")
-        print(f"  - Sample Keys in Track Dict: {list(restored_tracks[sample_vid].keys())[:5]} ...")
+        print(f"  - Sample Keys in Track Dict: {list(islice(restored_tracks[sample_vid], 5))} ...")
+
+
+def table_to_tracks_dict(table):
+    '''
+    Convert trajectory data from a pyarrow Table back to dictionary format.
+    
+    :param table: the pyarrow Table returned by read_parquet_meta
+    :return: restored_tracks (Dict)
+    '''
+    print("\n--- Converting Arrow Table back to Dict ---")
+    restored_tracks = _columns_to_tracks(table)
+    _report_tracks(restored_tracks)
+    return restored_tracks
+
+
+def read_parquet(parquet_path, columns=None, batch_size=None, downcast=False):
+    '''
+    Read Parquet file, extract embedded metadata, and convert trajectory data back to dictionary format.
+    
+    :param parquet_path: the path to the Parquet file
+    :param columns: only read these columns (None reads all); 'vehicle_id' is always included
+    :param batch_size: if given, stream the file in record batches of this many rows
+    :param downcast: cast the numeric list columns to narrower types (see downcast_columns); off by default
+    :return: restored_tracks (Dict), restored_meta (Dict)
+    '''
+    if batch_size is None:
+        table, restored_meta = read_parquet_meta(parquet_path, columns=columns, downcast=downcast)
+        return table_to_tracks_dict(table), restored_meta
+    
+    print("\n--- Reading back from Parquet ---")
+    
+    if columns is not None and 'vehicle_id' not in columns:
+        columns = ['vehicle_id'] + list(columns)
+    
+    # Read Parquet file lazily as a row-group stream over a memory map
+    with pa.memory_map(parquet_path, 'r') as source:
+        pf = pq.ParquetFile(source, pre_buffer=True)
+        schema = pf.schema_arrow
+        if columns is not None:
+            schema = pa.schema([schema.field(name) for name in columns], metadata=schema.metadata)
+        restored_meta = _report_loaded(_parse_dataset_meta(schema.metadata), schema, pf.metadata.num_rows)
+        
+        print("\n--- Converting Arrow Table back to Dict ---")
+        restored_tracks = {}
+        for batch in pf.iter_batches(batch_size=batch_size, columns=columns, use_threads=True):
+            if downcast:
+                batch = downcast_columns(batch)
+            restored_tracks.update(_columns_to_tracks(batch))
+    _report_tracks(restored_tracks)
     return restored_tracks, restored_meta
 
-def plot_trajectory_spacetime_diagram(trajectory_data, meta_data):
+
+def _lane_segments_numpy(offsets, times, head_s, speeds, lanes, lane_ids):
+    '''
+    Extract the in-lane segments and lane change points of all lanes in one pass
+    over consecutive frame pairs, then bucket them by lane.
+    A pair (j, j+1) inside one vehicle is an in-lane segment of lane_j when both
+    frames share the lane; otherwise it is a cut-out point of lane_j and a
+    cut-in point of lane_j+1.
+    
+    :param offsets: per-vehicle frame offsets (length N+1)
+    :param lane_ids: lane IDs to extract
+    :return: {lane_id: (segments (M, 2, 2), segment speeds (M,), lane change x (K,), lane change y (K,))}
+    '''
+    total_frames = len(times)
+    # Consecutive frame pairs (j, j+1); pairs spanning two vehicles are masked out
+    same_vehicle = np.ones(max(total_frames - 1, 0), dtype=bool)
+    starts = offsets[:-1]
+    boundaries = starts[(starts > 0) & (starts < total_frames)]
+    same_vehicle[boundaries - 1] = False
+    
+    curr_lane = lanes[:-1]
+    next_lane = lanes[1:]
+    
+    # Case 1: Driving within the lane
+    in_lane = (curr_lane == next_lane) & same_vehicle
+    seg_lane = curr_lane[in_lane]
+    # (M, 2, 2) segments: [(t_j, s_j), (t_j+1, s_j+1)]
+    segments = np.stack([
+        np.stack([times[:-1][in_lane], head_s[:-1][in_lane]], axis=1),
+        np.stack([times[1:][in_lane], head_s[1:][in_lane]], axis=1),
+    ], axis=1)
+    seg_speeds = speeds[:-1][in_lane]
+    
+    # Case 2: Lane change points (Cut-out of the current lane, Cut-in of the next lane)
+    change = (curr_lane != next_lane) & same_vehicle
+    lc_lane = np.concatenate([curr_lane[change], next_lane[change]])
+    lc_x = np.concatenate([times[:-1][change], times[1:][change]])
+    lc_y = np.concatenate([head_s[:-1][change], head_s[1:][change]])
+    
+    # Group by lane with a stable sort, then slice out every lane's block
+    seg_order = np.argsort(seg_lane, kind='stable')
+    seg_lane = seg_lane[seg_order]
+    lc_order = np.argsort(lc_lane, kind='stable')
+    lc_lane = lc_lane[lc_order]
+    
+    buckets = {}
+    for lane_id in lane_ids:
+        seg_idx = seg_order[np.searchsorted(seg_lane, lane_id, 'left'):np.searchsorted(seg_lane, lane_id, 'right')]
+        lc_idx = lc_order[np.searchsorted(lc_lane, lane_id, 'left'):np.searchsorted(lc_lane, lane_id, 'right')]
+        buckets[lane_id] = (segments[seg_idx], seg_speeds[seg_idx], lc_x[lc_idx], lc_y[lc_idx])
+    return buckets
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _lane_segments_numba(offsets, times, head_s, speeds, lane_idx, num_lanes, num_chunks):
+        '''
+        Numba version of _lane_segments_numpy: a parallel scan over vehicles that
+        buckets every lane at once. lane_idx maps each frame to its position in the
+        requested lanes (-1 for lanes that are not extracted).
+        The vehicles are split into num_chunks contiguous chunks. A first pass counts
+        the segments / lane change points of every (lane, chunk), the prefix sums give
+        each of them its own slice of the lane-grouped output, and a second pass fills it.
+        Scratch memory is O(num_lanes * num_chunks), output order is deterministic
+        (vehicle order within each lane) and no atomics are needed.
+        
+        :return: segments, segment speeds, segment lane bounds (num_lanes+1,),
+                 lane change x, lane change y, lane change lane bounds (num_lanes+1,)
+        '''
+        num_vehicles = len(offsets) - 1
+        seg_pos = np.zeros((num_lanes, num_chunks), dtype=np.int64)
+        lc_pos = np.zeros((num_lanes, num_chunks), dtype=np.int64)
+        
+        for c in prange(num_chunks):
+            for i in range(c * num_vehicles // num_chunks, (c + 1) * num_vehicles // num_chunks):
+                for j in range(offsets[i], offsets[i + 1] - 1):
+                    curr_lane = lane_idx[j]
+                    next_lane = lane_idx[j + 1]
+                    if curr_lane == next_lane:
+                        if curr_lane >= 0:
+                            seg_pos[curr_lane, c] += 1
+                    else:
+                        if curr_lane >= 0:
+                            lc_pos[curr_lane, c] += 1
+                        if next_lane >= 0:
+                            lc_pos[next_lane, c] += 1
+        
+        # Exclusive prefix sums: lane-major, then chunk order within each lane
+        seg_bounds = np.zeros(num_lanes + 1, dtype=np.int64)
+        lc_bounds = np.zeros(num_lanes + 1, dtype=np.int64)
+        for lane in range(num_lanes):
+            seg_total = seg_bounds[lane]
+            lc_total = lc_bounds[lane]
+            for c in range(num_chunks):
+                n_seg = seg_pos[lane, c]
+                n_lc = lc_pos[lane, c]
+                seg_pos[lane, c] = seg_total
+                lc_pos[lane, c] = lc_total
+                seg_total += n_seg
+                lc_total += n_lc
+            seg_bounds[lane + 1] = seg_total
+            lc_bounds[lane + 1] = lc_total
+        
+        segments = np.empty((seg_bounds[num_lanes], 2, 2), dtype=np.float64)
+        seg_speeds = np.empty(seg_bounds[num_lanes], dtype=np.float64)
+        lc_x = np.empty(lc_bounds[num_lanes], dtype=np.float64)
+        lc_y = np.empty(lc_bounds[num_lanes], dtype=np.float64)
+        
+        # Each chunk only advances its own cursors
+        for c in prange(num_chunks):
+            seg_cursor = seg_pos[:, c].copy()
+            lc_cursor = lc_pos[:, c].copy()
+            for i in range(c * num_vehicles // num_chunks, (c + 1) * num_vehicles // num_chunks):
+                for j in range(offsets[i], offsets[i + 1] - 1):
+                    curr_lane = lane_idx[j]
+                    next_lane = lane_idx[j + 1]
+                    if curr_lane == next_lane:
+                        if curr_lane >= 0:
+                            # Case 1: Driving within the lane
+                            k = seg_cursor[curr_lane]
+                            segments[k, 0, 0] = times[j]
+                            segments[k, 0, 1] = head_s[j]
+                            segments[k, 1, 0] = times[j + 1]
+                            segments[k, 1, 1] = head_s[j + 1]
+                            seg_speeds[k] = speeds[j]
+                            seg_cursor[curr_lane] = k + 1
+                    else:
+                        if curr_lane >= 0:
+                            # Cut-out of the current lane
+                            k = lc_cursor[curr_lane]
+                            lc_x[k] = times[j]
+                            lc_y[k] = head_s[j]
+                            lc_cursor[curr_lane] = k + 1
+                        if next_lane >= 0:
+                            # Cut-in of the next lane
+                            k = lc_cursor[next_lane]
+                            lc_x[k] = times[j + 1]
+                            lc_y[k] = head_s[j + 1]
+                            lc_cursor[next_lane] = k + 1
+        
+        return segments, seg_speeds, seg_bounds, lc_x, lc_y, lc_bounds
+
+
+def _bucket_lane_segments(offsets, times, head_s, speeds, lanes, lane_ids):
+    '''
+    Bucket in-lane segments and lane change points by lane in a single pass over
+    the trajectory data, using numba when available.
+    
+    :return: {lane_id: (segments (M, 2, 2), segment speeds (M,), lane change x (K,), lane change y (K,))}
+    '''
+    if not HAS_NUMBA:
+        return _lane_segments_numpy(offsets, times, head_s, speeds, lanes, lane_ids)
+    
+    # Map every frame's lane to its position in the sorted requested lanes (-1 if not requested)
+    sorted_lanes = np.unique(np.asarray(lane_ids, dtype=lanes.dtype))
+    lane_idx = np.full(len(lanes), -1, dtype=np.int64)
+    if len(sorted_lanes):
+        pos = np.minimum(np.searchsorted(sorted_lanes, lanes), len(sorted_lanes) - 1)
+        found = sorted_lanes[pos] == lanes
+        lane_idx[found] = pos[found]
+    
+    segments, seg_speeds, seg_bounds, lc_x, lc_y, lc_bounds = _lane_segments_numba(
+        offsets, times, head_s, speeds, lane_idx, len(sorted_lanes),
+        max(1, min(len(offsets) - 1, NUMBA_VEHICLE_CHUNKS)))
+    
+    buckets = {}
+    for k, lane_id in enumerate(sorted_lanes.tolist()):
+        seg_slice = slice(seg_bounds[k], seg_bounds[k + 1])
+        lc_slice = slice(lc_bounds[k], lc_bounds[k + 1])
+        buckets[lane_id] = (segments[seg_slice], seg_speeds[seg_slice], lc_x[lc_slice], lc_y[lc_slice])
+    return buckets
+
+
+def _draw_speed_raster(ax, lines, speeds):
+    '''
+    Draw segments as a mean-speed image instead of a LineCollection.
+    Points sampled along every segment are accumulated into a RASTER_BINS
+    (time, location) histogram, weighted by the segment speed.
+    
+    :param lines: segments (M, 2, 2)
+    :param speeds: segment speeds (M,)
+    :return: the AxesImage (for the colorbar), or None if no finite point is left to draw
+    '''
+    start = lines[:, 0, :]
+    delta = lines[:, 1, :] - start
+    # Sample [0, 1) of every segment; the next segment of the track covers its end point
+    fractions = np.arange(RASTER_SAMPLES_PER_SEGMENT) / RASTER_SAMPLES_PER_SEGMENT
+    with np.errstate(invalid='ignore'):
+        points = (start[None, :, :] + fractions[:, None, None] * delta[None, :, :]).reshape(-1, 2)
+    weights = np.tile(speeds, RASTER_SAMPLES_PER_SEGMENT)
+    
+    # NaN / inf coordinates or speeds would break the histogram range: drop them
+    finite = np.isfinite(points).all(axis=1) & np.isfinite(weights)
+    points = points[finite]
+    weights = weights[finite]
+    end_points = lines[:, 1, :][np.isfinite(lines[:, 1, :]).all(axis=1)]
+    if not len(points):
+        return None
+    
+    t_range = (min(points[:, 0].min(), end_points[:, 0].min(initial=np.inf)),
+               max(points[:, 0].max(), end_points[:, 0].max(initial=-np.inf)))
+    s_range = (min(points[:, 1].min(), end_points[:, 1].min(initial=np.inf)),
+               max(points[:, 1].max(), end_points[:, 1].max(initial=-np.inf)))
+    hist_range = [t_range, s_range]
+    count, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins=RASTER_BINS, range=hist_range)
+    speed_sum, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins=RASTER_BINS, range=hist_range, weights=weights)
+    
+    # Empty bins stay transparent
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_speed = np.where(count > 0, speed_sum / count, np.nan)
+    
+    return ax.imshow(mean_speed.T, origin='lower', aspect='auto', interpolation='nearest',
+                     extent=[t_range[0], t_range[1], s_range[0], s_range[1]],
+                     cmap="jet_r", vmin=0, vmax=35)
+
+
+def plot_trajectory_spacetime_diagram(trajectory_data, meta_data, max_workers=1):
     '''
     Visualize trajectory data using Matplotlib.
     Plot time-space diagram for vehicles.
@@ -90,8 +625,10 @@ def plot_trajectory_spacetime_diagram(trajectory_data, meta_data):
     Color the trajectory based on frenet_s_speed.
     Determine lane change positions based on lane_id.
     
-    :param trajectory_data: the trajectory data in dictionary format
+    :param trajectory_data: the trajectory data as TrajectoryColumns or in dictionary format
     :param meta_data: the meta data in dictionary format
+    :param max_workers: processes used to render the lanes (default 1: plot serially in this process).
+        Values > 1 use a 'spawn' process pool, so the calling script needs an if __name__ == '__main__' guard
     :return: None
     '''
     print("\n--- Plotting Spacetime Diagrams ---")
@@ -104,219 +641,342 @@ def plot_trajectory_spacetime_diagram(trajectory_data, meta_data):
     save_folder = "fig"
     os.makedirs(save_folder, exist_ok=True)
     
-    for target_lane_id in unique_lane_ids:
-        # Skip invalid lane ID
-        if target_lane_id == -1:
-            continue
-            
-        print(f"Processing Lane {target_lane_id}...")
-        
-        fig, ax = plt.subplots(figsize=(20, 8))
-        
-        lines = []
-        speeds = []
-        # Store lane change points: LC (Lane Change)
-        lc_points_x = []
-        lc_points_y = []
-        
-        for vid, track in trajectory_data.items():
-            # Extract data
-            frames = np.array(track['frame_index'])
-            s_coords = np.array(track['frenet_s'])
-            s_speeds = np.array(track['frenet_s_speed'])
-            lane_ids = np.array(track['lane_id'])
-            
-           
-            vehicle_length = track.get('vehicle_length', 5.0)
-            
-            # Determine trajectory direction: increasing or decreasing
-            # Use start and end points to determine overall trend
-            if len(s_coords) > 1 and s_coords[-1] < s_coords[0]:
-                direction_sign = -1
-            else:
-                direction_sign = 1
-
-            # Calculate vehicle head coordinate
-            # frenet_s is the center point
-            # If increasing (direction_sign=1) add length, if decreasing (direction_sign=-1) subtract length
-            head_s = s_coords + direction_sign * (vehicle_length / 2.0)
-            
-            # Calculate time: frame_index * frame_interval
-            times = frames * frame_interval
-            
-            # Iterate through all frames of the vehicle to find segments in target_lane_id
-            for i in range(len(frames) - 1):
-                curr_lane = lane_ids[i]
-                next_lane = lane_ids[i+1]
-                
-                # Case 1: Driving within the target lane
-                if curr_lane == target_lane_id and next_lane == target_lane_id:
-                    p1 = (times[i], head_s[i])
-                    p2 = (times[i+1], head_s[i+1])
-                    lines.append([p1, p2])
-                    speeds.append(abs(s_speeds[i])) # Use absolute speed
-                
-                # Case 2: Lane change points (Cut-in or Cut-out)
-                # Logic: Either this point or the next involves the target lane, and a lane change occurred
-                
-                # Cut-out: Currently in target, next frame not
-                elif curr_lane == target_lane_id and next_lane != target_lane_id:
-                    lc_points_x.append(times[i])
-                    lc_points_y.append(head_s[i])
-                    
-                # Cut-in: Currently not in target, next frame is
-                elif curr_lane != target_lane_id and next_lane == target_lane_id:
-                    lc_points_x.append(times[i+1])
-                    lc_points_y.append(head_s[i+1])
-
-        # Skip plotting if no data for this lane
-        if not lines:
-            print(f"  No data for Lane {target_lane_id}")
-            plt.close(fig)
-            continue
+    if isinstance(trajectory_data, TrajectoryColumns):
+        traj = trajectory_data
+    else:
+        traj = TrajectoryColumns.from_tracks(trajectory_data)
+    
+    # Per-vehicle quantities, computed once for all vehicles on the flat columns
+    starts = traj.offsets[:-1]
+    ends = traj.offsets[1:]
+    lengths = ends - starts
+    total_frames = len(traj.frame_index)
+    
+    # Determine trajectory direction: increasing or decreasing
+    # Use start and end points to determine overall trend
+    direction_sign = np.ones(len(traj))
+    if total_frames > 0:
+        first_s = traj.frenet_s[np.minimum(starts, total_frames - 1)]
+        last_s = traj.frenet_s[np.maximum(ends - 1, 0)]
+        direction_sign[(lengths > 1) & (last_s < first_s)] = -1
+    
+    # Calculate vehicle head coordinate
+    # frenet_s is the center point
+    # If increasing (direction_sign=1) add length, if decreasing (direction_sign=-1) subtract length
+    head_s = traj.frenet_s + np.repeat(direction_sign * (traj.vehicle_length / 2.0), lengths)
+    
+    # Calculate time: frame_index * frame_interval
+    times = traj.frame_index * frame_interval
+    speeds_abs = np.abs(traj.frenet_s_speed) # Use absolute speed
+    
+    # One pass over all vehicles, bucketing segments / lane change points by lane
+    plot_lane_ids = [lane_id for lane_id in unique_lane_ids if lane_id != -1]
+    lane_buckets = _bucket_lane_segments(traj.offsets, times, head_s, speeds_abs, traj.lane_id, plot_lane_ids)
+    
+    lane_jobs = [(lane_id, lane_buckets[lane_id]) for lane_id in plot_lane_ids]
+    max_workers = min(max_workers, len(lane_jobs))
+    plot_lane = partial(_plot_one_lane, save_folder=save_folder)
+    
+    if max_workers > 1:
+        # Opt-in: each lane figure is independent, render them in worker processes that
+        # only receive their own lane's (already bucketed) NumPy arrays.
+        # 'spawn': forking a process that already runs Arrow / numba threads can deadlock
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = []
+            for target_lane_id, lane_data in lane_jobs:
+                print(f"Processing Lane {target_lane_id}...")
+                futures.append(executor.submit(plot_lane, target_lane_id, lane_data))
+            for (target_lane_id, _), future in zip(lane_jobs, futures):
+                _report_lane(target_lane_id, future.result())
+    else:
+        for target_lane_id, lane_data in lane_jobs:
+            print(f"Processing Lane {target_lane_id}...")
+            _report_lane(target_lane_id, plot_lane(target_lane_id, lane_data))
 
+
+def _report_lane(target_lane_id, save_path):
+    if save_path is None:
+        print(f"  No data for Lane {target_lane_id}")
+    else:
+        print(f"  Saved: {save_path}")
+
+
+def _plot_one_lane(target_lane_id, lane_data, save_folder):
+    '''
+    Plot and save the spacetime diagram of one lane (also run in the worker processes).
+    
+    :param target_lane_id: the lane to plot
+    :param lane_data: (segments (M, 2, 2), segment speeds (M,), lane change x (K,), lane change y (K,))
+    :param save_folder: folder to save the figure in
+    :return: the saved figure path, or None if the lane has no data
+    '''
+    lines, speeds, lc_points_x, lc_points_y = lane_data
+
+    # Skip plotting if no data for this lane
+    if not len(lines):
+        return None
+    
+    fig, ax = plt.subplots(figsize=(20, 8))
+
+    mappable = None
+    if len(lines) > RASTER_SEGMENT_THRESHOLD:
+        # Too many segments to draw one by one: plot the mean speed per pixel bin
+        mappable = _draw_speed_raster(ax, lines, speeds)
+    if mappable is None:
         # Create LineCollection
         # Speed typically 0-35m/s (0-120km/h), use jet_r colormap
-        lc = LineCollection(lines, array=np.array(speeds), cmap="jet_r", linewidths=1.0)
-        lc.set_clim(vmin=0, vmax=35) # Set speed color range 0-35 m/s
-        ax.add_collection(lc)
-        
-        # Add Colorbar
-        cb = fig.colorbar(lc, ax=ax)
-        cb.set_label('Speed [m/s]')
-        
-        # Plot lane change points
-        if lc_points_x:
-            ax.scatter(lc_points_x, lc_points_y, 
-                       marker='o', s=20, 
-                       color='k', linewidths=0.8, 
-                       label='Lane Change', zorder=3)
-            ax.legend(loc='upper right')
-            
-        ax.autoscale()
-        ax.set_title(f'Lane {target_lane_id} Space-Time Diagram')
-        ax.set_xlabel("Time [s]")
-        ax.set_ylabel("Location [m]")
+        mappable = LineCollection(lines, array=speeds, cmap="jet_r", linewidths=1.0)
+        mappable.set_clim(vmin=0, vmax=35) # Set speed color range 0-35 m/s
+        ax.add_collection(mappable)
+    
+    # Add Colorbar
+    cb = fig.colorbar(mappable, ax=ax)
+    cb.set_label('Speed [m/s]')
+    
+    # Plot lane change points
+    if len(lc_points_x):
+        ax.scatter(lc_points_x, lc_points_y, 
+                   marker='o', s=20, 
+                   color='k', linewidths=0.8, 
+                   label='Lane Change', zorder=3)
+        ax.legend(loc='upper right')
         
-        # Save figure
-        save_path = os.path.join(save_folder, f'lane_{target_lane_id}_spacetime.png')
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=300)
-        plt.close(fig)
-        print(f"  Saved: {save_path}")
+    ax.autoscale()
+    ax.set_title(f'Lane {target_lane_id} Space-Time Diagram')
+    ax.set_xlabel("Time [s]")
+    ax.set_ylabel("Location [m]")
+    
+    # Save figure
+    save_path = os.path.join(save_folder, f'lane_{target_lane_id}_spacetime.png')
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=300)
+    plt.close(fig)
+    return save_path
+
+
+def _tracks_to_table(trajectory_data, columns):
+    '''
+    Pack the requested columns of a {vehicle_id: track} dict into a pyarrow Table.
+    '''
+    data = {'vehicle_id': list(trajectory_data.keys())}
+    for name in columns:
+        if name != 'vehicle_id':
+            values = pa.array([track.get(name) for track in trajectory_data.values()])
+            if pa.types.is_null(values.type):
+                # Column missing from every track: keep it a (null) list column
+                values = pa.nulls(len(values), pa.list_(pa.int64()))
+            data[name] = values
+    return pa.table(data)
 
 
 # intersection
 def analysis_movement_data(trajectory_data, meta_data):
     '''
     Analyze movement data from trajectory data.
+    
+    :param trajectory_data: the trajectory data in dictionary format (a pyarrow Table is also accepted)
+    :param meta_data: the meta data in dictionary format
+    :return: movement_counts (Dict)
     '''
-    print("\n--- Analyzing Movement Data ---")
+    if isinstance(trajectory_data, pa.Table):
+        table = trajectory_data
+    else:
+        table = _tracks_to_table(trajectory_data, ANALYSIS_COLUMNS)
+    return analysis_movement_data_arrow(table, meta_data)
+
+
+def analysis_content_hash(table, meta_data):
+    '''
+    SHA-256 over everything the movement analysis depends on: the frame_index and
+    lane_id contents and the (ordered) lane_sequence_to_movement_map.
     
+    :param table: pyarrow Table with frame_index and lane_id list columns
+    :param meta_data: the meta data in dictionary format
+    :return: hex digest (str)
+    '''
+    digest = hashlib.sha256()
     lane_sequence_to_movement_map = meta_data.get('lane_sequence_to_movement_map', {})
-    
-    # 1. Calculate global frame range to filter partial trajectories
-    all_start_frames = []
-    all_end_frames = []
-    for track in trajectory_data.values():
-        if 'frame_index' in track and track['frame_index'] is not None and len(track['frame_index']) > 0:
-            all_start_frames.append(track['frame_index'][0])
-            all_end_frames.append(track['frame_index'][-1])
-            
-    if not all_start_frames:
-        print("No valid frames found.")
-        return {}
+    # Always the standard json module: the digest must not depend on whether orjson is installed
+    digest.update(json.dumps(lane_sequence_to_movement_map, ensure_ascii=False).encode('utf-8'))
+    for name in ('frame_index', 'lane_id'):
+        if name not in table.column_names:
+            continue
+        offsets, values = _list_offsets_values(table.column(name))
+        digest.update(name.encode('utf-8'))
+        # Hashed as int64 so the digest does not depend on downcasting
+        digest.update(np.diff(offsets).astype(np.int64))
+        digest.update(values[offsets[0]:offsets[-1]].astype(np.int64))
+    return digest.hexdigest()
+
 
-    global_min_frame = min(all_start_frames)
-    global_max_frame = max(all_end_frames)
+def _load_analysis_cache(table, meta_data):
+    '''
+    Return the movement statistics cached in the Parquet metadata by
+    update_parquet_meta.py --precompute-analysis, or None if absent or stale.
+    '''
+    file_meta = table.schema.metadata or {}
+    if ANALYSIS_CACHE_KEY not in file_meta:
+        return None
+    cache = meta_json.loads(file_meta[ANALYSIS_CACHE_KEY])
+    if cache.get('content_hash') != analysis_content_hash(table, meta_data):
+        return None
+    return cache
+
+
+def analysis_movement_data_arrow(table, meta_data):
+    '''
+    Analyze movement data directly on the pyarrow Table returned by read_parquet_meta.
+    Results precomputed into the Parquet metadata are reused when they are still valid.
     
-    print(f"Global Frame Range: {global_min_frame} - {global_max_frame}")
+    :param table: pyarrow Table with (at least) frame_index and lane_id list columns
+    :param meta_data: the meta data in dictionary format
+    :return: movement_counts (Dict)
+    '''
+    print("\n--- Analyzing Movement Data ---")
     
-    # Initialize counters
-    movement_counts = {}
-    od_counts = {}
-    od_vehicles = {} # Store vehicle IDs for each OD pair
+    lane_sequence_to_movement_map = meta_data.get('lane_sequence_to_movement_map', {})
     
-    total_vehicles = len(trajectory_data)
-    valid_movement_vehicles = 0
-    undefined_filtered_count = 0
-
-    for vid, track in trajectory_data.items():
-        lane_ids = track.get('lane_id')
-        if lane_ids is None or len(lane_ids) == 0:
-            continue
-            
-        # Deduplicate lane_id while preserving order to get lane_sequence
-        lane_seq = []
-        for lid in lane_ids:
-            if not lane_seq or lane_seq[-1] != lid:
-                lane_seq.append(lid)
-                
-        if len(lane_seq) == 0:
-            continue
-            
-        # Check if any key from lane_sequence_to_movement_map is contained in lane_sequence
-        movement_name = "Undefined"
-        matched_key = None
-        
-        for key, name in lane_sequence_to_movement_map.items():
-            # Convert key "20-30" to list [20, 30]
-            key_list = [int(x) for x in key.split('-')]
-            n = len(key_list)
-            
-            # Check if key_list is a sublist of lane_seq
-            if any(lane_seq[i:i+n] == key_list for i in range(len(lane_seq) - n + 1)):
-                movement_name = name
-                matched_key = key
-                break
-                
-        if matched_key:
-            od_key = matched_key
-        else:
-            od_key = f"{lane_seq[0]}-{lane_seq[-1]}"
-            
-        # Check if we need to filter (only for Undefined movements)
-        if movement_name == "Undefined":
-            vehicle_frames = track.get('frame_index')
-            # Ensure vehicle_frames is valid and not empty
-            if vehicle_frames is None or len(vehicle_frames) == 0:
-                continue
-
-            v_start = vehicle_frames[0]
-            v_end = vehicle_frames[-1]
-            
-            # Exclusion condition: exists at global start or global end
-            if v_start < global_min_frame+3 or v_end > global_max_frame-3:
-                undefined_filtered_count += 1
-                continue
-        
-        # Count
-        movement_counts[movement_name] = movement_counts.get(movement_name, 0) + 1
-        od_counts[od_key] = od_counts.get(od_key, 0) + 1
-        
-        # Record Vehicle ID
-        if od_key not in od_vehicles:
-            od_vehicles[od_key] = []
-        od_vehicles[od_key].append(vid)
-        
-        if movement_name != "Undefined":
-            valid_movement_vehicles += 1
-
-    print(f"Total Vehicles: {total_vehicles}")
-    print(f"Identified Movements: {valid_movement_vehicles}")
-    print(f"Filtered Undefined Vehicles (Time Boundary): {undefined_filtered_count}")
+    stats = _load_analysis_cache(table, meta_data)
+    if stats is not None:
+        print("[Cache] Using analysis precomputed in the Parquet metadata")
+    else:
+        stats = compute_movement_statistics(table, meta_data)
+        if stats is None:
+            print("No valid frames found.")
+            return {}
+    
+    print(f"Global Frame Range: {stats['global_min_frame']} - {stats['global_max_frame']}")
+    print(f"Total Vehicles: {stats['total_vehicles']}")
+    print(f"Identified Movements: {stats['valid_movement_vehicles']}")
+    print(f"Filtered Undefined Vehicles (Time Boundary): {stats['undefined_filtered_count']}")
     
     print("\n[Movement Statistics]")
-    for name, count in sorted(movement_counts.items(), key=lambda x: x[1], reverse=True):
+    for name, count in sorted(stats['movement_counts'].items(), key=lambda x: x[1], reverse=True):
         print(f"  - {name}: {count}")
         
     print("\n[OD Pair Statistics (Top 10)]")
-    for od, count in sorted(od_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
+    for od, count in sorted(stats['od_counts'].items(), key=lambda x: x[1], reverse=True)[:10]:
         mapped_name = lane_sequence_to_movement_map.get(od, "Undefined")
         print(f"  - {od} ({mapped_name}): {count}")
         
 
-    return movement_counts
+    return stats['movement_counts']
+
+
+def compute_movement_statistics(table, meta_data):
+    '''
+    Compute the movement / OD statistics of analysis_movement_data_arrow without printing.
+    The per-vehicle work is vectorized over the flat Arrow list buffers of
+    frame_index and lane_id instead of looping over vehicles in Python.
+    
+    :param table: pyarrow Table with (at least) frame_index and lane_id list columns
+    :param meta_data: the meta data in dictionary format
+    :return: statistics (Dict, JSON-serializable), or None if there are no valid frames
+    '''
+    lane_sequence_to_movement_map = meta_data.get('lane_sequence_to_movement_map', {})
+    
+    # 1. Calculate global frame range to filter partial trajectories
+    if 'frame_index' not in table.column_names or 'lane_id' not in table.column_names:
+        return None
+    
+    frames_list = table.column('frame_index')
+    frame_counts = pc.fill_null(pc.list_value_length(frames_list), 0)
+    has_frames_mask = pc.greater(frame_counts, 0)
+    
+    # First / last frame of each vehicle: gather from the flattened values at the list
+    # boundaries (null for vehicles without frames, which min / max skip)
+    flat_frames = pc.list_flatten(frames_list)
+    frame_ends = pc.cumulative_sum(frame_counts)
+    v_start = pc.take(flat_frames, pc.if_else(has_frames_mask, pc.subtract(frame_ends, frame_counts), None))
+    v_end = pc.take(flat_frames, pc.if_else(has_frames_mask, pc.subtract(frame_ends, 1), None))
+    
+    global_min_frame = pc.min(v_start).as_py()
+    global_max_frame = pc.max(v_end).as_py()
+    if global_min_frame is None:
+        return None
+    
+    # 2. Deduplicate lane_id while preserving order to get lane_sequence (for all vehicles at once)
+    lane_offsets, lane_values = _list_offsets_values(table.column('lane_id'))
+    num_vehicles = len(lane_offsets) - 1
+    lane_lengths = np.diff(lane_offsets)
+    has_lanes = lane_lengths > 0
+    
+    flat_lanes = lane_values[lane_offsets[0]:lane_offsets[-1]]
+    flat_parent = np.repeat(np.arange(num_vehicles), lane_lengths)
+    keep = np.ones(len(flat_lanes), dtype=bool)
+    keep[1:] = (flat_lanes[1:] != flat_lanes[:-1]) | (flat_parent[1:] != flat_parent[:-1])
+    seq_lanes = flat_lanes[keep]
+    seq_parent = flat_parent[keep]
+    
+    # The deduplicated sequence starts and ends on the same lanes as the raw one
+    first_idx = np.where(has_lanes, lane_offsets[:-1], 0)
+    last_idx = np.where(has_lanes, lane_offsets[1:] - 1, 0)
+    start_lane = lane_values[first_idx] if len(lane_values) else np.zeros(num_vehicles, dtype=np.int64)
+    end_lane = lane_values[last_idx] if len(lane_values) else np.zeros(num_vehicles, dtype=np.int64)
+    
+    # 3. Check if any key from lane_sequence_to_movement_map is contained in lane_sequence
+    # movement_idx holds the position of the first matching key, -1 for Undefined
+    map_keys = list(lane_sequence_to_movement_map.keys())
+    # Parse every key once: "20-30" -> (20, 30)
+    key_lanes = [tuple(int(x) for x in key.split('-')) for key in map_keys]
+    movement_idx = np.full(num_vehicles, -1, dtype=np.int64)
+    
+    for k, key_list in enumerate(key_lanes):
+        n = len(key_list)
+        num_windows = len(seq_lanes) - n + 1
+        if num_windows <= 0:
+            continue
+        
+        # Check if key_list is a sublist of lane_seq: compare every window of length n
+        # and require the whole window to belong to the same vehicle
+        hit = seq_parent[n - 1:] == seq_parent[:num_windows]
+        for t, lid in enumerate(key_list):
+            hit &= seq_lanes[t:t + num_windows] == lid
+        
+        matched = np.zeros(num_vehicles, dtype=bool)
+        matched[seq_parent[:num_windows][hit]] = True
+        movement_idx[matched & (movement_idx < 0)] = k
+    
+    # 4. Filter Undefined movements that exist at global start or global end
+    is_undefined = movement_idx < 0
+    keep_mask = pc.and_(pc.greater_equal(v_start, global_min_frame + 3), pc.less_equal(v_end, global_max_frame - 3))
+    in_window = pc.fill_null(keep_mask, False).to_numpy(zero_copy_only=False)
+    has_frames = has_frames_mask.to_numpy(zero_copy_only=False)
+    filtered = has_lanes & is_undefined & has_frames & ~in_window
+    counted = has_lanes & (~is_undefined | (has_frames & in_window))
+    
+    # 5. Count with Arrow-native value_counts (first-appearance order, like dict insertion)
+    movement_names = ["Undefined"] + [lane_sequence_to_movement_map[key] for key in map_keys]
+    movement_counts = {}
+    for item in pc.value_counts(pa.array(movement_idx[counted] + 1)).to_pylist():
+        name = movement_names[item['values']]
+        movement_counts[name] = movement_counts.get(name, 0) + item['counts']
+    
+    # OD key: the matched map key, otherwise (first lane, last lane). Counted on integer
+    # (movement, first lane, last lane) rows; only the distinct keys are formatted as strings
+    od_movement = movement_idx[counted]
+    unmatched = od_movement < 0
+    od_rows = np.stack([
+        od_movement,
+        np.where(unmatched, start_lane[counted], 0),
+        np.where(unmatched, end_lane[counted], 0),
+    ], axis=1)
+    distinct_rows, first_seen, row_counts = np.unique(od_rows, axis=0, return_index=True, return_counts=True)
+    od_counts = {}
+    for i in np.argsort(first_seen, kind='stable'):
+        k, first_lane, last_lane = distinct_rows[i].tolist()
+        od_key = map_keys[k] if k >= 0 else f"{first_lane}-{last_lane}"
+        od_counts[od_key] = od_counts.get(od_key, 0) + int(row_counts[i])
+    
+    return {
+        'global_min_frame': global_min_frame,
+        'global_max_frame': global_max_frame,
+        'total_vehicles': table.num_rows,
+        'valid_movement_vehicles': int(np.count_nonzero(counted & ~is_undefined)),
+        'undefined_filtered_count': int(np.count_nonzero(filtered)),
+        'movement_counts': movement_counts,
+        'od_counts': od_counts,
+    }
 
 
 def main():
@@ -324,20 +984,29 @@ def main():
         description="Plot trajectory spacetime diagram from Parquet file."
     )
     parser.add_argument('--parquet',default='data/Hurong_20220617_B3_F1_demo.parquet', help="Path to the Parquet file")
+    parser.add_argument('--workers', type=int, default=1, help="Processes used to render the lane figures (default: 1, serial)")
     args = parser.parse_args()
-    trajectory_data, meta_data = read_parquet(args.parquet)
     
-    if trajectory_data and meta_data:
+    # Peek at the footer to decide the scenario, then only read the columns it needs
+    schema = pq.read_schema(args.parquet)
+    lane_map = (read_dataset_meta(args.parquet) or {}).get('lane_sequence_to_movement_map')
+    needed_columns = ANALYSIS_COLUMNS if lane_map else PLOT_COLUMNS
+    columns = [name for name in needed_columns if name in schema.names]
+    # Keep the Arrow table: neither consumer needs the per-vehicle dictionary,
+    # and float32 positions / speeds are enough for them
+    table, meta_data = read_parquet_meta(args.parquet, columns=columns, downcast=True)
+    
+    if table.num_rows and meta_data:
         lane_map = meta_data.get('lane_sequence_to_movement_map')
         
         if not lane_map:
             # freeway
             print("\n[Scenario] Detected Freeway (lane_sequence_to_movement_map is empty or missing)")
-            plot_trajectory_spacetime_diagram(trajectory_data, meta_data)
+            plot_trajectory_spacetime_diagram(TrajectoryColumns.from_table(table), meta_data, max_workers=args.workers)
         else:
             # intersection
             print("\n[Scenario] Detected Intersection (lane_sequence_to_movement_map is present)")
-            analysis_movement_data(trajectory_data, meta_data)
+            analysis_movement_data_arrow(table, meta_data)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
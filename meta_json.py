@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   meta_json.py
+@Time    :   2026/01/06
+@Author  :   XinkaiJi
+@Contact :   xinkaiji@hotmail.com
+@Version :   1.0
+@Software:   VS Code
+@Desc    :   JSON encoding / decoding of the metadata embedded in the Parquet files.
+    Shared by data_tools.py and update_parquet_meta.py so both read and write the same bytes.
+    - loads: decode a UTF-8 JSON document (bytes), with orjson when it is installed.
+    - dumps: encode an object as UTF-8 JSON bytes.
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; fall back to the standard json module
+    orjson = None
+
+
+def loads(data):
+    '''
+    Decode a UTF-8 JSON document (bytes), with orjson when it is installed.
+    Documents orjson rejects (e.g. the NaN / Infinity written by json.dumps)
+    are decoded with the standard json module.
+    '''
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data.decode('utf-8'))
+
+
+def dumps(obj):
+    '''
+    Encode obj as UTF-8 JSON bytes.
+    Always the standard json module: orjson would write NaN / Infinity as null, and the
+    written bytes should not depend on whether orjson is installed.
+    '''
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
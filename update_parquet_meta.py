@@ -14,7 +14,6 @@ changes back to the corresponding Parquet file's metadata.
 '''
 
 import argparse
-import json
 import os
 import sys
 
@@ -24,11 +23,59 @@ try:
 except ImportError:
     sys.exit("Error: pyarrow is required. Please install it.")
 
+import meta_json
 
-def update_parquet_meta(parquet_path: str, json_path: str, output_path: str = None, compression: str = 'zstd'):
+
+# Parquet encodings tuned for the trajectory columns (matched on the top-level column name)
+# - small-range / repetitive columns: dictionary encoding
+# - monotonic frame indices: delta encoding
+# - floating point positions / speeds: byte stream split (helps zstd on FP data)
+DICTIONARY_COLUMNS = ['lane_id', 'lane_sequence', 'location_name', 'vehicle_id']
+DELTA_COLUMNS = ['frame_index']
+BYTE_STREAM_SPLIT_COLUMNS = ['frenet_s', 'frenet_s_speed']
+ROW_GROUP_SIZE = 50_000
+
+
+def _parquet_write_options(parquet_path: str, compression: str) -> dict:
+    """
+    Build the pq.write_table keyword arguments for rewriting parquet_path.
+    Encodings are set per leaf column path (e.g. 'frenet_s.list.element'), so they
+    also apply to the list columns; columns missing from the file are skipped.
+    """
+    parquet_schema = pq.read_metadata(parquet_path).schema
+    leaf_columns = [parquet_schema.column(i) for i in range(len(parquet_schema))]
+
+    def leaves(names, physical_types=None):
+        return [column.path for column in leaf_columns
+                if column.path.split('.')[0] in names
+                and (physical_types is None or column.physical_type in physical_types)]
+
+    column_encoding = {path: 'DELTA_BINARY_PACKED' for path in leaves(DELTA_COLUMNS, ('INT32', 'INT64'))}
+    column_encoding.update({path: 'BYTE_STREAM_SPLIT' for path in leaves(BYTE_STREAM_SPLIT_COLUMNS, ('FLOAT', 'DOUBLE'))})
+
+    options = {
+        'compression': compression,
+        'use_dictionary': leaves(DICTIONARY_COLUMNS),
+        'column_encoding': column_encoding or None,
+        'write_statistics': True,
+        'row_group_size': ROW_GROUP_SIZE,
+        'data_page_version': '2.0',
+    }
+    if compression.lower() == 'zstd':
+        options['compression_level'] = 3
+    return options
+
+
+def update_parquet_meta(parquet_path: str, json_path: str, output_path: str = None, compression: str = 'zstd',
+                        precompute_analysis: bool = False, downcast: bool = False):
     """
     Read a Parquet file and a JSON file, update the Parquet file's 'dataset_meta'
     metadata field with the JSON content, and save the file.
+    With precompute_analysis, the movement statistics of data_tools.analysis_movement_data
+    are also stored in the 'analysis_cache' metadata field so later runs can skip the analysis.
+    With downcast, the numeric list columns are stored with the narrower types of
+    data_tools.downcast_columns (int32 frame_index, float32 frenet_s, ...).
+    Columns that are already narrow are kept as they are either way.
     """
     if not os.path.exists(parquet_path):
         raise FileNotFoundError(f"Parquet file not found: {parquet_path}")
@@ -37,15 +84,18 @@ def update_parquet_meta(parquet_path: str, json_path: str, output_path: str = No
 
     # 1. Load the new metadata from JSON
     print(f"Reading metadata from: {json_path}")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        new_meta_dict = json.load(f)
-
-    # Convert to JSON string and then bytes
-    new_meta_json_str = json.dumps(new_meta_dict, ensure_ascii=False)
+    with open(json_path, 'rb') as f:
+        new_meta_dict = meta_json.loads(f.read())
     
     # 2. Read the existing Parquet file
     print(f"Reading Parquet file: {parquet_path}")
     table = pq.read_table(parquet_path)
+    if downcast:
+        # Imported lazily: data_tools pulls in numpy / matplotlib
+        from data_tools import downcast_columns
+
+        print("Downcasting numeric columns...")
+        table = downcast_columns(table)
 
     # 3. Prepare updated metadata
     # Get existing metadata (ensure it's not None)
@@ -55,9 +105,21 @@ def update_parquet_meta(parquet_path: str, json_path: str, output_path: str = No
     # Note: Keys in pyarrow metadata are usually bytes.
     updated_meta = {
         **existing_meta,
-        b'dataset_meta': new_meta_json_str.encode('utf-8')
+        b'dataset_meta': meta_json.dumps(new_meta_dict)
     }
 
+    if precompute_analysis:
+        # Imported lazily: data_tools pulls in numpy / matplotlib
+        from data_tools import ANALYSIS_CACHE_KEY, analysis_content_hash, compute_movement_statistics
+
+        print("Precomputing movement analysis...")
+        stats = compute_movement_statistics(table, new_meta_dict)
+        if stats is None:
+            print("No valid frames found, analysis cache not written.")
+        else:
+            analysis_cache = {'content_hash': analysis_content_hash(table, new_meta_dict), **stats}
+            updated_meta[ANALYSIS_CACHE_KEY] = meta_json.dumps(analysis_cache)
+
     # Replace schema metadata in the table
     new_table = table.replace_schema_metadata(updated_meta)
 
@@ -70,7 +132,8 @@ def update_parquet_meta(parquet_path: str, json_path: str, output_path: str = No
     
     print(f"{action} Parquet file: {output_path}")
     # Use the same compression default as export_site_field_csv.py (zstd)
-    pq.write_table(new_table, output_path, compression=compression)
+    write_options = _parquet_write_options(parquet_path, compression)
+    pq.write_table(new_table, output_path, **write_options)
     print("Done.")
 
 
@@ -82,11 +145,16 @@ def main():
     parser.add_argument('json', help="Path to the JSON file containing new metadata")
     parser.add_argument('--output', '-o', default=None, help="Output Parquet path. If not provided, overwrites the input Parquet file.")
     parser.add_argument('--compression', default='zstd', help="Compression to use when writing Parquet (default: zstd)")
+    parser.add_argument('--precompute-analysis', action='store_true',
+                        help="Also store the movement analysis results in the Parquet metadata")
+    parser.add_argument('--downcast', action='store_true',
+                        help="Store frame_index/lane_id as int32/int16 and frenet_s/frenet_s_speed as float32")
 
     args = parser.parse_args()
 
     try:
-        update_parquet_meta(args.parquet, args.json, args.output, args.compression)
+        update_parquet_meta(args.parquet, args.json, args.output, args.compression, args.precompute_analysis,
+                            args.downcast)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)